@@ -1,18 +1,68 @@
+import os
+import re
+import datetime
+from decimal import Decimal
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Union, List, Callable
+from typing import TYPE_CHECKING, Optional, Union, List, Dict, Iterable, Iterator
 
-import pandas as pd
 import duckdb
-import pyarrow.parquet as pq
 import pyarrow as pa
+import pyarrow.compute as pc
 from loguru import logger
 
-from utils import read_table, nth_from_generator, copy_count_gen_items
+if TYPE_CHECKING:
+    # pandas is imported by pyarrow/duckdb only when a frame is actually requested
+    import pandas as pd
+
+from utils import quote_ident, quote_literal
 from schemas import settings
 
 
 logger.add(settings.user_logs_dir / "file_{time}.log")
 
+# how many recently fetched pages each reader keeps
+PAGES_CACHE_SIZE = 16
+# rows per arrow batch when streaming whole results, small batches cost per-batch overhead
+STREAM_BATCH_SIZE = 65536
+# results of queries with these operators are computed once into `RESULT_TABLE_NAME`,
+# otherwise every page would aggregate or sort the whole input again
+MATERIALIZE_OPERATORS = re.compile(r"\b(?:HASH_GROUP_BY|PERFECT_HASH_GROUP_BY|WINDOW|ORDER_BY)\b")
+RESULT_TABLE_NAME = "__parvu_result"
+# parquet file with its row numbers, unfiltered pages of the file are looked up by row number
+# instead of OFFSET, which would read and skip every row before the page
+NUMBERED_ROWS_NAME = "__parvu_rows"
+# only plain reading statements are explained, see `needs_materialization`
+READING_STATEMENT = re.compile(r"\s*(?:SELECT|WITH|FROM)\b", re.IGNORECASE)
+# duckdb type ids searched by value equality instead of a text scan
+INTEGER_TYPE_IDS = {'tinyint', 'smallint', 'integer', 'bigint', 'hugeint',
+                    'utinyint', 'usmallint', 'uinteger', 'ubigint', 'uhugeint'}
+FLOAT_TYPE_IDS = {'float', 'double'}
+EXCEL_CELL_TYPES = (str, int, float, bool, Decimal, datetime.date, datetime.time)
+# lowercased file extension -> duckdb COPY options, see `Reader.export`.
+# exported parquet files come out about half the size of duckdb's default snappy
+EXPORT_OPTIONS = {
+    '.csv': "FORMAT csv, HEADER",
+    '.parquet': "FORMAT parquet, COMPRESSION zstd",
+}
+# results of statements that can't be wrapped into COPY are registered under this name for export
+EXPORT_VIEW_NAME = "__parvu_export"
+# aggregates shown for numeric columns when statistics are requested, see `Reader.column_stats`
+STATS_FUNCTIONS = ["count", "min", "max", "avg"]
+# lowercased file extension -> duckdb connection method registering the file
+FILE_READERS = {
+    '.parquet': duckdb.DuckDBPyConnection.read_parquet,
+    '.csv': duckdb.DuckDBPyConnection.read_csv,
+    '.json': duckdb.DuckDBPyConnection.read_json,
+}
+
+
+def _excel_cell(value):
+    """ excel cells hold only scalars and timezone-naive dates, everything else is written as text """
+    if value is None or isinstance(value, EXCEL_CELL_TYPES) and getattr(value, 'tzinfo', None) is None:
+        return value
+    return str(value)
+
 
 class Reader:
     """
@@ -29,59 +79,201 @@ class Reader:
             - batchsize: rows per page
         """
         self.path = path
+        self.suffix = path.suffix.lower()
         self.virtual_table_name = virtual_table_name
         self.batchsize = batchsize
 
         logger.info(f"Initializing Reader with path: {path} and virtual_table_name: {virtual_table_name}")
         
         self.validate()
+        # own connection: file is registered once and all queries run against it.
+        # object cache keeps parquet metadata between page queries
+        config = {'threads': os.cpu_count() or 1, 'enable_object_cache': True}
+        try:
+            self.con = duckdb.connect(':memory:', config={**config, 'memory_limit': settings.duckdb_memory_limit}
+                                      if settings.duckdb_memory_limit else config)
+        except duckdb.Error as e:
+            # settings file edited by hand, a bad limit must not make every file unopenable
+            logger.warning(f"Ignoring duckdb_memory_limit '{settings.duckdb_memory_limit}': {e}")
+            self.con = duckdb.connect(':memory:', config=config)
         # origin file
         self.duckdf = self.__read_into_duckdf()#.sort("__index_level_0__")
-        # for querying
-        self.duckdf_query = self.duckdf
-        self.batches: List[pa.RecordBatch] = self.duckdf_query.to_arrow_table().to_batches(self.batchsize)
-        self.columns_query = self.duckdf_query.columns
-        self.columns = self.duckdf.columns
+        self.file_query = f"SELECT * FROM {quote_ident(self.virtual_table_name)}"
+        self.numbered_rows = False
+        # text files are queryable only after `load`
+        self.loaded = self.suffix == '.parquet'
+        if self.suffix == '.parquet':
+            self.duckdf.create_view(self.virtual_table_name)
+            if 'file_row_number' not in self.duckdf.columns:
+                self.con.read_parquet(str(self.path), file_row_number=True).create_view(NUMBERED_ROWS_NAME)
+                self.numbered_rows = True
+        # for querying: `duckdf_result` is the lazy query result, filters are kept as sql in `filtered_query`
+        self.duckdf_result = self.duckdf
+        # column name -> allowed values
+        self.filters: Dict[str, list] = {}
+        # columns left out of pages, duckdb then doesn't read them from the file at all
+        self.hidden_columns: List[str] = []
+        # bumped with each new query result. Materialized results are all read by the same sql,
+        # so cached pages and counts are told apart by it
+        self.generation = 0
+        self.set_page_query(self.file_query)
+        # recently fetched pages, see `_page_key`
+        self._pages_cache: "OrderedDict[tuple, pa.Table]" = OrderedDict()
+        # row counts of recently counted filtered queries, see `_count_key`
+        self._counts_cache: "OrderedDict[tuple, int]" = OrderedDict()
+        # (column name, limit) -> distinct values of `duckdf_result`, dropped when the result changes
+        self._uniques_cache: Dict[tuple, list] = {}
+        # immutable, so readers and `Data` share one copy
+        self.columns = tuple(self.duckdf.columns)
 
         logger.debug(f"Reader initialized with columns: {self.columns}")
 
 
-    def update_batches(self):
-        """ updates self.batches using self.duckdf_query """
-        logger.debug("Updating batches")
-        self.batches = self.duckdf_query.to_arrow_table().to_batches(self.batchsize)
+    def load(self):
+        """ parse text file into a duckdb table, once. Text files have no columnar layout or stats,
+            every query over a view would parse them again. Parsing reads the whole file,
+            so it is left out of the constructor and done by the query worker """
+        if self.loaded:
+            return
+        logger.info(f"Loading {self.path} into table {self.virtual_table_name}")
+        self.duckdf.create(self.virtual_table_name)
+        self.duckdf = self.con.table(self.virtual_table_name)
+        # nothing can be queried before loading, so the result is still the file
+        self.duckdf_result = self.duckdf
+        self.loaded = True
+
+    def set_page_query(self, query: str):
+        """ build paginated sql once per query and filters, pages only bind LIMIT/OFFSET values """
+        self.query_text = query.strip().rstrip(';')
+        filtered_query, filter_params = self.query_text, []
+        if self.filters:
+            predicates = []
+            for column, values in self.filters.items():
+                not_null = [v for v in values if v is not None]
+                predicate = f"{quote_ident(column)} IN ({', '.join('?' * len(not_null))})" if not_null else "FALSE"
+                if len(not_null) < len(values):
+                    predicate = f"({predicate} OR {quote_ident(column)} IS NULL)"
+                predicates.append(predicate)
+                filter_params.extend(not_null)
+            filtered_query = f"SELECT * FROM ({self.query_text}) WHERE {' AND '.join(predicates)}"
+        # assigned together, `source` is read from other threads
+        self.filtered_query, self.filter_params = filtered_query, filter_params
+        if self.numbered_rows and self.filtered_query == self.file_query:
+            # same LIMIT, OFFSET values bound, but the offset is a row number the parquet scan can seek to
+            excluded = ", ".join(map(quote_ident, ['file_row_number', *self.hidden_columns]))
+            self.page_query = f"SELECT * EXCLUDE ({excluded}) FROM {NUMBERED_ROWS_NAME} WHERE file_row_number >= $2 LIMIT $1"
+            return
+        projection = f"* EXCLUDE ({', '.join(map(quote_ident, self.hidden_columns))})" if self.hidden_columns else "*"
+        self.page_query = f"SELECT {projection} FROM ({self.filtered_query}) LIMIT ? OFFSET ?"
+
+    def set_filters(self, filters: Dict[str, Iterable]):
+        """ keep only rows where column value is one of the given ones, filtering is done by duckdb.
+            Only sql is built here, nothing runs until a page, count or export is requested """
+        logger.info(f"Setting filters on columns: {list(filters)}")
+        self.filters = {column: list(values) for column, values in filters.items() if values}
+        self.set_page_query(self.query_text)
+
+    def set_hidden_columns(self, columns: Iterable[str]):
+        """ leave given columns out of pages, row count and filters are not affected """
+        logger.info(f"Hiding columns: {list(columns)}")
+        self.hidden_columns = list(columns)
+        self.set_page_query(self.query_text)
 
 
     def __read_into_duckdf(self) -> duckdb.DuckDBPyRelation:
         path_str = str(self.path)
         logger.debug(f"Reading data from {path_str}")
-        if self.path.suffix.lower() == '.parquet':
-            return duckdb.read_parquet(path_str)
-        elif self.path.suffix.lower() == '.csv':
-            return duckdb.read_csv(path_str)
-        elif self.path.suffix.lower() == '.json':
-            return duckdb.read_json(path_str)
-        else:
+        read = FILE_READERS.get(self.suffix)
+        if read is None:
             raise ValueError(f"File extension {self.path.suffix} is not supported")
+        return read(self.con, path_str)
 
     def validate(self):
         assert self.path.exists() and \
                self.path.is_file() and \
-               self.path.suffix.lower() in [".parquet", ".csv", ".json"], \
+               self.suffix in FILE_READERS, \
                "Path must be a valid Parquet, CSV or JSON file"
         logger.info(f"Validated path: {self.path}")
 
-    def get_generator(self, chunksize: int) -> List[pa.RecordBatch]:
-        """ returns a list of pyarrow batches """
+    def source(self) -> tuple:
+        """ filtered query sql and its bound values. Pass them to `count_rows`, `export` and others
+            to work on this result even if query or filters are changed meanwhile """
+        return self.filtered_query, tuple(self.filter_params)
+
+    def _source(self, query: Optional[str], params: Optional[Iterable]) -> tuple:
+        """ given sql and values, current filtered query by default """
+        if query is None:
+            return self.filtered_query, list(self.filter_params)
+        return query, list(params or [])
+
+    def get_generator(self, chunksize: int = STREAM_BATCH_SIZE, query: Optional[str] = None,
+                      params: Optional[Iterable] = None) -> Iterator[pa.RecordBatch]:
+        """ yields pyarrow batches of filtered query result, result is not materialized as a whole.
+            Runs on own cursor, so page queries meanwhile don't cut the stream """
         logger.debug(f"Getting generator with chunksize: {chunksize}")
-        return self.duckdf_query.to_arrow_table().to_batches(chunksize)
-
-    def get_nth_batch(self, n: int, as_df: bool = True):
+        query, params = self._source(query, params)
+        with self.con.cursor() as cursor:
+            yield from cursor.execute(query, params).fetch_record_batch(chunksize)
+
+    def _page_key(self, n: int) -> tuple:
+        """ page identity: file version, result generation, sql with its filter values and page bounds """
+        return (self.path.stat().st_mtime, self.generation, self.page_query, tuple(self.filter_params), self.batchsize, n)
+
+    def get_cached_batch(self, n: int) -> Optional[pa.Table]:
+        """ nth batch if it was fetched recently for the same query, else None """
+        key = self._page_key(n)
+        page = self._pages_cache.get(key)
+        if page is not None:
+            self._pages_cache.move_to_end(key)
+        return page
+
+    def get_nth_batch(self, n: int, as_df: bool = False):
         logger.debug(f"Getting {n}th batch with chunksize: {self.batchsize} as_df: {as_df}")
-        pa_batch = nth_from_generator(self.batches, n-1)
-        return pa_batch.to_pandas() if as_df else pa_batch
-
-    def search(self, search_query: str, column: str, as_df: bool = False, case: bool = False) -> Union[duckdb.DuckDBPyRelation, pd.DataFrame]:
+        page = self.get_cached_batch(n)
+        if page is None:
+            offset = (n - 1) * self.batchsize
+            try:
+                res = self.con.execute(self.page_query, self.filter_params + [self.batchsize, offset])
+            except duckdb.ParserException:
+                # statements like EXPLAIN can not be wrapped into subquery
+                res = self.duckdf_result.limit(self.batchsize, offset)
+            page = res.fetch_arrow_table()
+            self._pages_cache[self._page_key(n)] = page
+            if len(self._pages_cache) > PAGES_CACHE_SIZE:
+                self._pages_cache.popitem(last=False)
+        # split_blocks skips consolidating same-typed columns into one copied block.
+        # no self_destruct: the arrow page stays in cache
+        return page.to_pandas(split_blocks=True) if as_df else page
+
+    def _count_key(self, query: str, params: list) -> tuple:
+        """ count identity: file version, result generation, sql with its filter values.
+            Generation is taken before counting: a count that outlives its result is stored under the old one """
+        return (self.path.stat().st_mtime, self.generation, query, tuple(params))
+
+    def count_rows(self, query: Optional[str] = None, params: Optional[Iterable] = None) -> int:
+        """ count rows of filtered query result, runs on own cursor so can be called from another thread.
+            Counts are cached, so toggling back to previous filters doesn't count again """
+        query, params = self._source(query, params)
+        key = self._count_key(query, params)
+        n_rows = self._counts_cache.get(key)
+        if n_rows is not None:
+            self._counts_cache.move_to_end(key)
+            return n_rows
+
+        logger.debug(f"Counting rows of: '{query}'")
+        with self.con.cursor() as cursor:
+            try:
+                n_rows = cursor.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+            except duckdb.ParserException:
+                # statements like EXPLAIN can not be wrapped into subquery, their results are small
+                n_rows = cursor.execute(query, params).fetch_arrow_table().num_rows
+        self._counts_cache[key] = n_rows
+        if len(self._counts_cache) > PAGES_CACHE_SIZE:
+            self._counts_cache.popitem(last=False)
+        return n_rows
+
+    def search(self, search_query: str, column: str, as_df: bool = False, case: bool = False,
+               columns: Optional[List[str]] = None) -> Union[duckdb.DuckDBPyRelation, "pd.DataFrame"]:
         """ 
         search query string inside column 
             Parameters:
@@ -89,34 +281,211 @@ class Reader:
                 - column: column name
                 - as_df: return as pandas dataframe
                 - case: case sensitive
+                - columns: columns to return, all by default. Others are not read from the file
         """
         logger.info(f"Searching for '{search_query}' in column '{column}' with case sensitivity: {case}")
-        like = "LIKE" if case else "ILIKE"
+        # identifiers can't be bound, so only known column names get into the statement
+        unknown = [name for name in [column, *(columns or [])] if name not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        select_list = ", ".join(map(quote_ident, columns)) if columns else "*"
+        predicate, param = self._search_predicate(column, self.duckdf, search_query, case)
         sql_query = f"""
-                    SELECT * 
-                    FROM {self.virtual_table_name}
-                    WHERE CAST({column} AS VARCHAR) {like} '%{search_query}%'
+                    SELECT {select_list} 
+                    FROM {quote_ident(self.virtual_table_name)}
+                    WHERE {predicate}
                     """
-        duck_res = self.duckdf.query(virtual_table_name=self.virtual_table_name,
-                                     sql_query=sql_query)
+        # search string is bound, so quotes in it can't break the statement
+        duck_res = self.con.sql(sql_query, params=[param])
 
         return duck_res.to_df() if as_df else duck_res
 
-    def query(self, query: str, as_df: bool = False) -> Union[duckdb.DuckDBPyRelation, pd.DataFrame]:
+    @staticmethod
+    def _search_predicate(column_name: str, relation: duckdb.DuckDBPyRelation, search_query: str,
+                          case: bool = False) -> tuple:
+        """ sql condition and its bound value for `search`.
+            A number searched in a numeric column is compared by value: no text cast of every row,
+            and parquet row groups are skipped by their min/max statistics """
+        column_type = dict(zip(relation.columns, relation.types)).get(column_name)
+        type_id = column_type.id if column_type is not None else None
+        try:
+            if type_id in INTEGER_TYPE_IDS:
+                return f"{quote_ident(column_name)} = ?", int(search_query)
+            if type_id in FLOAT_TYPE_IDS:
+                return f"{quote_ident(column_name)} = ?", float(search_query)
+            if type_id == 'decimal':
+                return f"{quote_ident(column_name)} = ?", Decimal(search_query)
+        except (ValueError, ArithmeticError):
+            # not a number, fall back to the text search
+            pass
+        return Reader._contains_predicate(column_name, relation, case), search_query
+
+    @staticmethod
+    def _contains_predicate(column_name: str, relation: duckdb.DuckDBPyRelation, case: bool = False) -> str:
+        """ sql condition: column text contains the bound `?` string. 
+            `contains` is a plain substring scan, unlike [I]LIKE it doesn't treat % and _ in the string as wildcards """
+        column = quote_ident(column_name)
+        column_types = dict(zip(relation.columns, relation.types))
+        # cast only non text columns
+        if column_types.get(column_name) != duckdb.typing.VARCHAR:
+            column = f"CAST({column} AS VARCHAR)"
+        return f"contains({column}, ?)" if case else f"contains(lower({column}), lower(?))"
+
+    def query(self, query: str, as_df: bool = False) -> Union[duckdb.DuckDBPyRelation, "pd.DataFrame"]:
         """ run provided sql query with class lvl setted virtual_table_name name """
         logger.info(f"Executing query: '{query}' on virtual_table_name: {self.virtual_table_name}")
-        duck_res = self.duckdf.query(virtual_table_name=self.virtual_table_name,
-                                     sql_query=query)
-        # update duckdf_query and batches
-        logger.debug(f"Updating duckdf_query with query result")
-        self.duckdf_query = duck_res
-        self.update_batches()
-        return duck_res.to_pandas() if as_df else duck_res
-
-    def agg_get_uniques(self, column_name: str) -> List[str]:
-        """ get unique values for given column """
+        if self.needs_materialization(query):
+            # plain table, not TEMP: counting runs on a cursor, which doesn't see temp tables
+            logger.debug(f"Materializing query result into {RESULT_TABLE_NAME}")
+            self.con.execute(f"CREATE OR REPLACE TABLE {RESULT_TABLE_NAME} AS {query.strip().rstrip(';')}")
+            duck_res = self.con.table(RESULT_TABLE_NAME)
+            query = f"SELECT * FROM {RESULT_TABLE_NAME}"
+        else:
+            # binding raises for a bad query, previous result and its table have to stay usable then
+            duck_res = self.con.sql(query)
+            self.con.execute(f"DROP TABLE IF EXISTS {RESULT_TABLE_NAME}")
+        logger.debug(f"Updating duckdf_result with query result")
+        self._set_result(duck_res, query)
+        return duck_res.to_df() if as_df else duck_res
+
+    def _set_result(self, relation: duckdb.DuckDBPyRelation, query: str):
+        """ make `relation`, read by `query`, the query result """
+        # filters, hidden columns and distinct values belong to the previous result
+        self.filters = {}
+        self.hidden_columns = []
+        self._uniques_cache = {}
+        self.duckdf_result = relation
+        # after the result is in place: a count that sees the new generation also sees the new table
+        self.generation += 1
+        self.set_page_query(query)
+
+    def reset(self):
+        """ make the whole file the query result again, cached pages and counts are dropped.
+            A materialized result table is left to the next query, exports of it may still be running """
+        logger.debug("Resetting query result to the file")
+        self._pages_cache.clear()
+        self._counts_cache.clear()
+        self._set_result(self.duckdf, self.file_query)
+
+    def needs_materialization(self, query: str) -> bool:
+        """ whether query plan has operators that consume whole input before the first row """
+        if not READING_STATEMENT.match(query):
+            return False
+        try:
+            plan = self.con.execute(f"EXPLAIN {query.strip().rstrip(';')}").fetchall()
+        except duckdb.Error:
+            return False
+        return any(MATERIALIZE_OPERATORS.search(row[1]) for row in plan)
+
+    def agg_get_uniques(self, column_name: str, limit: Optional[int] = None, search: Optional[str] = None) -> list:
+        """ get unique values for given column of the unfiltered query result, at most `limit` of them.
+            With `search` only values containing it (case insensitive) are returned """
         logger.debug(f"Getting unique values for column: {column_name}")
-        return self.duckdf_query.unique(column_name).to_df()[column_name].to_list()
+        # runs on the thread pool: values of the previous result must not get into the cache of a new one
+        cache, key = self._uniques_cache, (column_name, limit)
+        if search is None and key in cache:
+            return cache[key]
+        if column_name not in self.duckdf_result.columns:
+            raise ValueError(f"Unknown column: '{column_name}'")
+
+        column = quote_ident(column_name)
+        if search is not None:
+            # one statement, so duckdb applies DISTINCT, ORDER BY and LIMIT while scanning.
+            # own cursor: the search isn't run on the connection that fetches pages
+            limit_clause, params = ("LIMIT ?", [search, limit]) if limit is not None else ("", [search])
+            with self.con.cursor() as cursor:
+                return cursor.execute(f"SELECT DISTINCT {column} FROM ({self.query_text}) "
+                                      f"WHERE {self._contains_predicate(column_name, self.duckdf_result)} "
+                                      f"ORDER BY 1 {limit_clause}", params).fetch_arrow_table().column(0).to_pylist()
+
+        values = None
+        with self.con.cursor() as cursor:
+            if limit is not None and self._many_uniques(cursor, column, limit):
+                # `limit` smallest rows keep only a small heap. If they are all different, they are exactly
+                # the first `limit` distinct values and hashing every value of a high cardinality column is skipped
+                smallest = cursor.execute(f"SELECT {column} FROM ({self.query_text}) ORDER BY 1 LIMIT ?",
+                                          [limit]).fetch_arrow_table().column(0)
+                try:
+                    if pc.count_distinct(smallest, mode='all').as_py() == len(smallest):
+                        values = smallest.to_pylist()
+                except pa.ArrowNotImplementedError:
+                    pass
+            if values is None:
+                # sorted, so a cut list is the first values rather than arbitrary ones
+                limit_clause, params = ("LIMIT ?", [limit]) if limit is not None else ("", [])
+                # one column array instead of a python tuple per row
+                values = cursor.execute(f"SELECT DISTINCT {column} FROM ({self.query_text}) ORDER BY 1 {limit_clause}",
+                                        params).fetch_arrow_table().column(0).to_pylist()
+        cache[key] = values
+        return values
+
+    def _many_uniques(self, cursor: duckdb.DuckDBPyConnection, column: str, limit: int) -> bool:
+        """ whether the first rows of the result already hold `limit` distinct values of `column`.
+            Reading them stops early, and a column that fails it is most likely low cardinality,
+            where the top-N probe of `agg_get_uniques` only adds a second full scan """
+        sample = cursor.execute(f"SELECT count(DISTINCT {column}) FROM (SELECT {column} FROM ({self.query_text}) LIMIT ?)",
+                                [limit * 4]).fetchone()[0]
+        return sample >= limit
+
+    def export(self, path: str, query: Optional[str] = None, params: Optional[Iterable] = None):
+        """ write filtered query result to csv, parquet or xlsx file.
+            csv and parquet are written by duckdb COPY on own cursor, rows don't pass through python """
+        suffix = Path(path).suffix.lower()
+        if suffix == '.xlsx':
+            return self.to_xlsx(path, query, params)
+        if suffix not in EXPORT_OPTIONS:
+            raise ValueError(f"File extension {suffix} is not supported for export")
+        query, params = self._source(query, params)
+        logger.info(f"Exporting query result to {path}")
+        with self.con.cursor() as cursor:
+            try:
+                cursor.execute(f"COPY ({query}) TO {quote_literal(path)} ({EXPORT_OPTIONS[suffix]})", params)
+            except duckdb.ParserException:
+                # statements like EXPLAIN can not be wrapped into COPY, their results are small
+                cursor.register(EXPORT_VIEW_NAME, cursor.execute(query, params).fetch_arrow_table())
+                cursor.execute(f"COPY {EXPORT_VIEW_NAME} TO {quote_literal(path)} ({EXPORT_OPTIONS[suffix]})")
+
+    def to_xlsx(self, path: str, query: Optional[str] = None, params: Optional[Iterable] = None):
+        """ write filtered query result to excel file, rows are streamed batch by batch """
+        # excel export is optional, openpyxl is needed only here
+        from openpyxl import Workbook
+
+        logger.info(f"Exporting query result to {path}")
+        query, params = self._source(query, params)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        with self.con.cursor() as cursor:
+            batches = cursor.execute(query, params).fetch_record_batch(STREAM_BATCH_SIZE)
+            sheet.append(batches.schema.names)
+            for batch in batches:
+                for row in zip(*(column.to_pylist() for column in batch.columns)):
+                    sheet.append([_excel_cell(value) for value in row])
+        workbook.save(path)
+
+    def column_stats(self, query: Optional[str] = None, params: Optional[Iterable] = None) -> Dict[str, tuple]:
+        """ numeric column name -> values of `STATS_FUNCTIONS` over filtered query result.
+            All columns are aggregated by one scan on own cursor """
+        query, params = self._source(query, params)
+        with self.con.cursor() as cursor:
+            # no rows are read, only result column types are resolved
+            cursor.execute(f"SELECT * FROM ({query}) LIMIT 0", params)
+            numeric = [column[0] for column in cursor.description if column[1] == 'NUMBER']
+            if not numeric:
+                return {}
+            aggregates = ", ".join(f"{func}({quote_ident(column)})" for column in numeric for func in STATS_FUNCTIONS)
+            values = cursor.execute(f"SELECT {aggregates} FROM ({query})", params).fetchone()
+        n_funcs = len(STATS_FUNCTIONS)
+        return {column: values[i * n_funcs:(i + 1) * n_funcs] for i, column in enumerate(numeric)}
+
+    def interrupt(self):
+        """ cancel the query running on the connection, it raises `duckdb.InterruptException` """
+        logger.debug("Interrupting running query")
+        self.con.interrupt()
+
+    def close(self):
+        """ close the underlying duckdb connection """
+        logger.debug(f"Closing connection to {self.path}")
+        self.con.close()
 
     def __str__(self):
         return f"<ParVuDataReader:{self.path.as_posix()}[{self.columns}]>"
@@ -143,64 +512,98 @@ class Data:
                              virtual_table_name=self.virtual_table_name,
                              batchsize=batchsize)
         
-        self.ftype = 'pq' if self.path.suffix == '.parquet' else 'txt'
+        self.ftype = 'pq' if self.reader.suffix == '.parquet' else 'txt'
         # for big data bunch counting can be slow, so do if manually called by `calc_n_batches`
         self.total_batches = "???"
-        self.columns = self.reader.columns.copy()
+        self.columns = self.reader.columns
 
         logger.info(f"""Data initialized with path: {path}, 
                     virtual_table_name: {virtual_table_name}, 
                     file type: {self.ftype} and
                     batchsize: {batchsize}""")
 
-    def get_nth_batch(self, n: int, as_df: bool = True) -> Union[pd.DataFrame, pa.RecordBatch]:
+    def load(self):
+        """ make text file queryable, slow for big files. See `Reader.load` """
+        self.reader.load()
+
+    def get_nth_batch(self, n: int, as_df: bool = False) -> Union["pd.DataFrame", pa.Table]:
         logger.debug(f"Getting {n}th batch with chunksize: {self.reader.batchsize} as_df: {as_df}")
+        self.reader.load()
         batch = self.reader.get_nth_batch(n, as_df)
         logger.debug(f"Items in batch: {len(batch)}")
         return batch
 
-    def get_generator(self, chunksize: int) -> List[pa.RecordBatch]:
+    def get_cached_batch(self, n: int) -> Optional[pa.Table]:
+        """ nth batch without querying, None if it wasn't fetched recently """
+        return self.reader.get_cached_batch(n)
+
+    def get_generator(self, chunksize: int = STREAM_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
         logger.debug(f"Getting generator with chunksize: {chunksize}")
         return self.reader.get_generator(chunksize)
 
-    def get_uniques(self, column_name: str) -> List[str]:
-        """get unique values for given column"""
+    def get_uniques(self, column_name: str, limit: Optional[int] = None, search: Optional[str] = None) -> list:
+        """get unique values for given column, at most `limit` of them, optionally only ones containing `search`"""
         logger.debug(f"Getting unique values for column: {column_name}")
-        return self.reader.agg_get_uniques(column_name)
+        return self.reader.agg_get_uniques(column_name, limit, search)
 
-    def execute_query(self, query: str, as_df: bool = False) -> Union[List[pa.RecordBatch], pd.DataFrame]:
-        """ executes provided query and update duckdf_query """
+    def execute_query(self, query: str, as_df: bool = False) -> Union[duckdb.DuckDBPyRelation, "pd.DataFrame"]:
+        """ executes provided query and update duckdf_result. Result is not materialized unless `as_df` """
         max_chunksize = self.reader.batchsize
         logger.info(f"Executing query: '{query}' with max_chunksize: {max_chunksize}")
+        self.reader.load()
         if not as_df:
-            batches = self.reader.query(query, as_df).to_arrow_table().to_batches(max_chunksize=max_chunksize)
-            # update total_pages:
-            self.total_batches = len(batches)
-            return batches
+            res = self.reader.query(query, as_df)
+            # counting needs the whole result, so leave it to `calc_n_batches`
+            self.total_batches = "???"
+            return res
         else:
             res = self.reader.query(query, as_df)
             self.total_batches = self.calc_n_batches()
             return res
 
 
-    def search(self, query: str, column: str, as_df: bool = True, case: bool = False) -> Union[duckdb.DuckDBPyRelation, pd.DataFrame]:
+    def set_filters(self, filters: Dict[str, Iterable]):
+        """ filter query result by column values, see `Reader.set_filters` """
+        self.reader.set_filters(filters)
+        self.total_batches = "???"
+
+    def set_hidden_columns(self, columns: Iterable[str]):
+        """ leave columns out of pages, see `Reader.set_hidden_columns` """
+        self.reader.set_hidden_columns(columns)
+
+    def search(self, query: str, column: str, as_df: bool = False, case: bool = False,
+               columns: Optional[List[str]] = None) -> Union[duckdb.DuckDBPyRelation, "pd.DataFrame"]:
         logger.info(f"Searching for '{query}' in column '{column}' with case sensitivity: {case}")
-        return self.reader.search(query, column, as_df, case)
+        return self.reader.search(query, column, as_df, case, columns)
 
-    def calc_n_batches(self) -> int:
-        """ calculates the number of batches in data. Use carefully, because it can take time for big data """
+    def count_batches(self, query: Optional[str] = None, params: Optional[Iterable] = None) -> int:
+        """ number of batches in filtered query result or in given sql with its values, see `Reader.source`.
+            Counting is done by duckdb on own cursor, so it can run on any thread """
         chunksize = self.reader.batchsize
         logger.debug(f"Calculating number of batches with chunksize: {chunksize}")
-        # gen, n = copy_count_gen_items(self.reader.batches)
-        logger.debug(f"Number of batches: {len(self.reader.batches)}")
-        return len(self.reader.batches)
+        n_batches = -(-self.reader.count_rows(query, params) // chunksize)
+        logger.debug(f"Number of batches: {n_batches}")
+        return n_batches
+
+    def calc_n_batches(self) -> int:
+        """ calculates the number of batches in data and updates `total_batches` """
+        self.total_batches = self.count_batches()
+        return self.total_batches
     
 
     def reset_duckdb(self):
         """ reset query result table to file table """
-        logger.debug("Resetting duckdf_query to original duckdf")
-        self.reader.duckdf_query = self.reader.duckdf
-        self.reader.update_batches()
+        logger.debug("Resetting duckdf_result to original duckdf")
+        self.reader.reset()
+        self.total_batches = "???"
+
+    def interrupt(self):
+        """ cancel the running page query, see `Reader.interrupt` """
+        self.reader.interrupt()
+
+    def close(self):
+        """ release the file, instance is not usable after that """
+        self.reader.close()
 
     def __str__(self):
         return f"<ParVuDataInstance:{self.path.as_posix()}[{self.reader.columns}]>"
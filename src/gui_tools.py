@@ -1,42 +1,21 @@
-from typing import Tuple
-from io import StringIO
-import sys
+from typing import Optional, Union, Dict, Sequence
 
-import duckdb
+from core import STATS_FUNCTIONS
 
 
-def render_df_info(duckdf: duckdb.DuckDBPyRelation) -> str:
-    """ returns md like formatted df.info """
-    shape = duckdf.shape
+def render_df_info(columns: Sequence[str], types: Sequence, n_rows: Union[int, str],
+                   stats: Optional[Dict[str, tuple]] = None) -> str:
+    """ returns md like formatted column names and types, `n_rows` may be a placeholder while counting.
+        With `stats` (see `Reader.column_stats`) numeric columns get count/min/max/mean """
+    h = f"### Rows: {n_rows}, Columns: {len(columns)}\n{'-'*50}\n"
+    headers = ["column", "type"] + (["non null", "min", "max", "mean"] if stats is not None else [])
+    markdown_table = "| " + " | ".join(headers) + " |\n"
+    markdown_table += "|-" + "-|-".join(["-" * len(header) for header in headers]) + "-|\n"
+    for column, column_type in zip(columns, types):
+        row = [column.replace("|", "\\|"), str(column_type)]
+        if stats is not None:
+            # qt markdown merges empty cells, so they get placeholders
+            row += ["NULL" if value is None else str(value) for value in stats.get(column, ["-"] * len(STATS_FUNCTIONS))]
+        markdown_table += "| " + " | ".join(row) + " |\n"
 
-    output_buffer = StringIO()
-    sys.stdout = output_buffer
-    duckdf.describe().show(max_width=10**19)
-    sys.stdout = sys.__stdout__
-    descr = output_buffer.getvalue()
-
-    h = f"### Rows: {shape[0]}, Columns: {shape[1]}\n{'-'*50}\n"
-    try:
-        lines = descr.strip().split("\n")
-        headers = lines[1].strip("│").split("│")
-        headers = [header.strip() for header in headers]
-        types = lines[2].strip("│").split("│")
-        types = [t.strip() for t in types]
-        data_lines = lines[4:-1]
-        data = []
-        for line in data_lines:
-            row = line.strip("│").split("│")
-            row = [item.strip() for item in row]
-            data.append(row)
-
-        # Build the markdown table
-        markdown_table = "| " + " | ".join(headers) + " |\n"
-        markdown_table += "|-" + "-|-".join(["-" * len(header) for header in headers]) + "-|\n"
-        markdown_table += "| " + " | ".join(types) + " |\n"
-        for row in data:
-            markdown_table += "| " + " | ".join(row) + " |\n"
-
-        return h + markdown_table
-    
-    except Exception as e:
-        return h + '\n' + descr
+    return h + markdown_table
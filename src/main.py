@@ -1,16 +1,20 @@
+import re
 import sys
+import threading
+from functools import partial
 from pathlib import Path
-from typing import Union
-from io import StringIO
+from typing import Optional, Union, Callable
 
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog, QTableWidget, 
-                             QTableWidgetItem, QHBoxLayout, QMenu, QAction, QToolButton, QMainWindow, QMessageBox, QFormLayout, 
-                             QDialog, QTextBrowser)
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog, QTableView, 
+                             QHBoxLayout, QMenu, QAction, QToolButton, QMainWindow, QMessageBox, QFormLayout, 
+                             QDialog, QTextBrowser, QWidgetAction)
 from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor, QFont, QMovie, QIcon
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QRegExp
+from PyQt5.QtCore import (Qt, QObject, QThread, QThreadPool, QRunnable, pyqtSignal, pyqtSlot, QRegularExpression,
+                          QAbstractTableModel, QModelIndex)
 
 import duckdb
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from schemas import settings, Settings, recents
 from query_revisor import Revisor, BadQueryException
@@ -18,7 +22,12 @@ from gui_tools import render_df_info
 from core import Data
 
 
+# filter menu lists at most this many distinct values of a column
+FILTER_MENU_MAX_VALUES = 500
+
+
 class AnimationWidget(QWidget):
+    """ loading animation, created once and shown/hidden around each query """
     def __init__(self, parent=None):
         super(AnimationWidget, self).__init__(parent)
         self.setFixedSize(100, 100)
@@ -26,54 +35,134 @@ class AnimationWidget(QWidget):
         self.movie = QMovie("src/static/loading-thinking.gif")
         self.label = QLabel(self)
         self.label.setMovie(self.movie)
-        self.start()
+        self.hide()
     
     def start(self):
         self.movie.start()
+        self.show()
+        self.raise_()
     
     def stop(self):
         self.movie.stop()
-        self.close()
+        self.hide()
 
 
 class SQLHighlighter(QSyntaxHighlighter):
+    # shared by all highlighters, compiled by the first one
+    _keywords_pattern: QRegularExpression = None
+    _keyword_format: QTextCharFormat = None
+
     def __init__(self, parent=None):
         super(SQLHighlighter, self).__init__(parent)
-        self._highlighting_rules = []
+        if SQLHighlighter._keywords_pattern is None:
+            SQLHighlighter._compile()
 
+    @classmethod
+    def _compile(cls):
         keyword_format = QTextCharFormat()
         keyword_format.setForeground(QColor("blue"))
         keyword_format.setFontWeight(QFont.Bold)
-        keywords = settings.sql_keywords + [settings.render_vars(settings.default_data_var_name)]
+        keywords = frozenset(settings.sql_keywords + [settings.render_vars(settings.default_data_var_name)])
 
-        for keyword in keywords:
-            pattern = QRegExp(f"\\b{keyword}\\b", Qt.CaseInsensitive)
-            self._highlighting_rules.append((pattern, keyword_format))
+        # one alternation scans a block once instead of once per keyword; longer keywords first
+        alternation = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+        keywords_pattern = QRegularExpression(f"\\b(?:{alternation})\\b", QRegularExpression.CaseInsensitiveOption)
+        keywords_pattern.optimize()
+        cls._keyword_format, cls._keywords_pattern = keyword_format, keywords_pattern
 
     def highlightBlock(self, text):
-        for pattern, format in self._highlighting_rules:
-            index = pattern.indexIn(text)
-            while index >= 0:
-                length = pattern.matchedLength()
-                self.setFormat(index, length, format)
-                index = pattern.indexIn(text, index + length)
+        matches = self._keywords_pattern.globalMatch(text)
+        while matches.hasNext():
+            match = matches.next()
+            self.setFormat(match.capturedStart(), match.capturedLength(), self._keyword_format)
         self.setCurrentBlockState(0)
 
-class QueryThread(QThread):
-    resultReady = pyqtSignal(pd.DataFrame)
-    errorOccurred = pyqtSignal(str)
 
-    def __init__(self, 
-                 DATA: Data, 
-                 nth_batch: int, 
-                 app: 'ParquetSQLApp',
-                 query: str = None):
+class ArrowTableModel(QAbstractTableModel):
+    """ table model over a page arrow table, columns are stringified up front or on first access """
+    def __init__(self, table: pa.Table = None, parent=None):
+        super(ArrowTableModel, self).__init__(parent)
+        self.setTable(table if table is not None else pa.table({}))
+
+    def setTable(self, table: pa.Table, str_columns: list = None):
+        """ `str_columns` are display strings already made by `stringify`, e.g. on the query thread """
+        self.beginResetModel()
+        self._table = table
+        self._str_columns = list(str_columns) if str_columns is not None else [None] * table.num_columns
+        # column types are looked up once per page, not per painted cell
+        self._numeric = [pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t)
+                         for t in table.schema.types]
+        self.endResetModel()
+
+    @staticmethod
+    def stringify(arrow_column: pa.ChunkedArray) -> list:
+        """ vectorized cast of the whole column to display strings """
+        try:
+            return pc.fill_null(pc.cast(arrow_column, pa.string()), 'NULL').to_pylist()
+        except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+            # nested types (lists, structs) have no arrow cast to string
+            return [str(v) for v in arrow_column.to_pylist()]
+
+    def _str_column(self, column: int) -> list:
+        """ display strings of the column, done once per page """
+        values = self._str_columns[column]
+        if values is None:
+            values = self.stringify(self._table.column(column))
+            self._str_columns[column] = values
+        return values
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._table.num_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._table.num_columns
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            # strings keep full precision, Qt's own number formatting rounds floats to 6 digits
+            return self._str_column(index.column())[index.row()]
+        if role == Qt.TextAlignmentRole and self._numeric[index.column()]:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._table.column_names[section]
+        return str(section + 1)
+
+
+class QueryWorker(QObject):
+    """ runs queries one by one on a single long-lived thread, jobs are tagged with sequence number """
+    # seq, page table, page strings, (sql, values) the page was read from, `readerState`
+    resultReady = pyqtSignal(int, object, object, object, object)
+    # seq, message, `readerState`
+    errorOccurred = pyqtSignal(int, str, object)
+
+    def __init__(self):
         super().__init__()
-        self.file_path = file_path
-        self.query = query
-        self.nth_batch = nth_batch
-        self.DATA = DATA
-        self.app = app
+        # seq of the newest requested job, set from the GUI thread
+        self.latest_seq = 0
+        # (seq, data) of the page being fetched for a pure page switch, that fetch may be cancelled.
+        # set and cleared under the lock, so `interruptPage` can't hit the job after it
+        self.interruptible: Optional[tuple] = None
+        self.lock = threading.Lock()
+
+    def interruptPage(self, seq: int):
+        """ cancel the page fetch of a page switch older than `seq`, called from the GUI thread """
+        with self.lock:
+            if self.interruptible is not None and self.interruptible[0] < seq:
+                self.interruptible[1].interrupt()
+
+    @staticmethod
+    def readerState(DATA: Data) -> tuple:
+        """ filters and hidden columns the reader ended up with, copied for the GUI thread.
+            A failed query leaves the previous ones in place, so the GUI takes them from here """
+        reader = DATA.reader
+        return {column: set(values) for column, values in reader.filters.items()}, list(reader.hidden_columns)
 
     def queryRevisor(self, query: str) -> Union[str, None]:
         """ do checking and changes in query before it goes to run """
@@ -83,30 +172,79 @@ class QueryThread(QThread):
         
         elif isinstance(rev_res, BadQueryException):
             return rev_res
-        
-    def run(self):
-        
+
+    @pyqtSlot(int, object, int, object, object, object, bool)
+    def runQuery(self, seq: int, DATA: Data, nth_batch: int, query: str = None, filters: dict = None,
+                 hidden_columns: list = None, reset: bool = False):
+        # page switch superseded by a newer job, reset, query, filter and column changes always have to be applied
+        page_job = query is None and filters is None and hidden_columns is None and not reset
+        if seq != self.latest_seq and page_job:
+            return
+
         try:
-            if self.query and isinstance(self.query, str) and self.query.strip():
-                query = self.queryRevisor(self.query)
-                if isinstance(query, BadQueryException):
-                    raise Exception(query.name + ": " + query.message)
+            # first job after an open parses text files, the GUI shows loading meanwhile
+            DATA.load()
+            if reset:
+                DATA.reset_duckdb()
+
+            if query and isinstance(query, str) and query.strip():
+                revised = self.queryRevisor(query)
+                if isinstance(revised, BadQueryException):
+                    raise Exception(revised.name + ": " + revised.message)
                 
-                self.DATA.execute_query(query, as_df=False)
+                DATA.execute_query(revised, as_df=False)
+
+            if filters is not None:
+                DATA.set_filters(filters)
+
+            if hidden_columns is not None:
+                DATA.set_hidden_columns(hidden_columns)
                 
-            df = self.DATA.get_nth_batch(n=self.nth_batch, as_df=True)  
-            self.resultReady.emit(df)
-            
+            if page_job:
+                with self.lock:
+                    self.interruptible = (seq, DATA)
+            try:
+                table = DATA.get_nth_batch(n=nth_batch, as_df=False)
+            finally:
+                with self.lock:
+                    self.interruptible = None
+            # strings are made here, so the GUI thread only paints
+            str_columns = [ArrowTableModel.stringify(column) for column in table.columns]
+            # pages are counted on the thread pool, so next page jobs don't wait for the count
+            self.resultReady.emit(seq, table, str_columns, DATA.reader.source(), self.readerState(DATA))
+
         except Exception as e:
             err_message = f"""
-                            An error occurred while executing the query: '{self.query}'\n
+                            An error occurred while executing the query: '{query}'\n
                             Error: '{str(e)}'
                         """
             # raise e
-            self.errorOccurred.emit(err_message)
+            self.errorOccurred.emit(seq, err_message, self.readerState(DATA))
+
+
+class Task(QRunnable):
+    """ one-off job for the global thread pool: distinct values, counts, statistics, exports.
+        Its result, or the raised exception, is passed with `callback` through `done` to the GUI thread """
+    def __init__(self, fn: Callable, callback: Callable, done: pyqtSignal):
+        super().__init__()
+        self.fn = fn
+        self.callback = callback
+        self.done = done
+
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            result = e
+        self.done.emit(self.callback, result)
 
 
 class ParquetSQLApp(QMainWindow):
+    # seq, DATA, nth_batch, query, filters, hidden_columns, reset -> QueryWorker.runQuery
+    queryRequested = pyqtSignal(int, object, int, object, object, object, bool)
+    # callback, result of a `Task`
+    taskDone = pyqtSignal(object, object)
+
     def __init__(self, file_path=None):
         super().__init__()
         self.setWindowTitle('ParVu')
@@ -115,17 +253,39 @@ class ParquetSQLApp(QMainWindow):
         self.page = 1
         self.total_pages = None
         self.rows_per_page = settings.render_vars(settings.result_pagination_rows_per_page)
-        self.df = pd.DataFrame()
+        # arrow table of the currently displayed page
+        self.page_data = pa.table({})
+        # (sql, values) the displayed page was read from, exports and table info work on it.
+        # empty: reader's current query
+        self.page_source = ()
+        # bumped whenever query, filters or file change, page count of an older result is dropped
+        self._result_id = 0
+        # result id whose pages are being counted
+        self._counting = None
+        # seq of the last query, filter or columns job the worker hasn't answered yet.
+        # until then reader's page query is the old one and cached pages are looked up by it
+        self._pending_seq = None
+        # column name -> values to keep, applied by duckdb over the whole query result
+        self.active_filters = {}
+        self.hidden_columns = []
+        # all queries go through one worker thread, results of outdated jobs are dropped by seq
+        self._seq = 0
+        self.queryThread = QThread(self)
+        self.queryWorker = QueryWorker()
+        self.queryWorker.moveToThread(self.queryThread)
+        self.queryRequested.connect(self.queryWorker.runQuery)
+        self.queryWorker.resultReady.connect(self.handleResults)
+        self.queryWorker.errorOccurred.connect(self.handleError)
+        self.queryThread.start()
+        # everything else that runs duckdb goes to the thread pool, so the GUI thread never waits for it
+        self.taskDone.connect(self.onTaskDone)
         # use this variable to store opened files path
         self.file_path = Path(file_path) if file_path else None
 
         self.initUI()
 
         if self.file_path:
-            self.DATA = Data(path = self.file_path, 
-                             virtual_table_name = settings.render_vars(settings.default_data_var_name),
-                             batchsize = int(settings.result_pagination_rows_per_page))
-            
+            self.openData(self.file_path)
             self.filePathEdit.setText(file_path)
             self.execute()
 
@@ -172,7 +332,9 @@ class ParquetSQLApp(QMainWindow):
         self.resultLabel = QLabel('Results:')
         layout.addWidget(self.resultLabel)
 
-        self.resultTable = QTableWidget()
+        self.resultModel = ArrowTableModel(parent=self)
+        self.resultTable = QTableView()
+        self.resultTable.setModel(self.resultModel)
         self.resultTable.setStyleSheet(f"background-color: f{settings.colour_resultTable}")
         self.resultTable.setContextMenuPolicy(Qt.CustomContextMenu)
         self.resultTable.customContextMenuRequested.connect(self.showContextMenu)
@@ -198,6 +360,8 @@ class ParquetSQLApp(QMainWindow):
         self.loadingLabel = QLabel()
         layout.addWidget(self.loadingLabel)
         self.loadingLabel.setVisible(False)
+        # gif is decoded once, loadPage only starts and stops it
+        self.loading = AnimationWidget(self)
 
         central_widget = QWidget()
         central_widget.setLayout(layout)
@@ -280,89 +444,218 @@ class ParquetSQLApp(QMainWindow):
             self.updateRecentsMenu()
 
 
+    def openData(self, file_path) -> Optional[Data]:
+        """ open file into `self.DATA`, same file is registered only once.
+            If the file can't be opened, error is shown, previous data stays and None is returned """
+        if hasattr(self, 'DATA') and self.DATA.path == Path(file_path):
+            return self.DATA
+
+        try:
+            DATA = Data(path = file_path, 
+                        virtual_table_name = settings.render_vars(settings.default_data_var_name),
+                        batchsize = int(settings.result_pagination_rows_per_page))
+        except Exception as e:
+            # an exception escaping a Qt slot aborts the application
+            self.resultLabel.setText(f"Error: can't open '{file_path}': {e}")
+            self.loading.stop()
+            return None
+        # closed only once the new one is usable
+        if hasattr(self, 'DATA'):
+            self.DATA.close()
+        self.DATA = DATA
+        self.total_pages = None
+        self.active_filters = {}
+        self.hidden_columns = []
+        self.page_source = ()
+        self._result_id += 1
+        return self.DATA
+
     def ViewFile(self):
         if self.file_path:
-            if not hasattr(self, 'DATA'):
-                self.DATA = Data(path = file_path, 
-                                 virtual_table_name = settings.render_vars(settings.default_data_var_name),
-                                 batchsize = int(settings.result_pagination_rows_per_page))
-                
-            else:
-                self.DATA.reset_duckdb()
-
+            if hasattr(self, 'DATA') and self.DATA.path == self.file_path:
+                # reset is queued after running jobs, filters and hidden columns are taken from its answer
+                self.total_pages = None
+                self.execute(reset=True)
+                return
+            self.openData(self.file_path)
             self.execute()
 
 
-    def execute(self):
+    def execute(self, reset: bool = False):
         self.page = 1
-        self.loadPage()
+        self.loadPage(reset=reset)
         self.update_page_text()
 
 
     def executeQuery(self):
         self.page = 1
+        self.total_pages = None
+        # new query result drops filters and hidden columns of the previous one,
+        # they are taken from the worker's answer: a failed query keeps them
         self.loadPage(query=self.sqlEdit.toPlainText())
         self.update_page_text()
 
-    def loadPage(self, query: str=None):
-        self.loading = AnimationWidget(self)
+    def applyFilters(self):
+        self.page = 1
+        self.total_pages = None
+        self.loadPage(filters={column: list(values) for column, values in self.active_filters.items()})
+        self.update_page_text()
+
+    def toggleFilter(self, column_name: str, value, checked: bool):
+        values = self.active_filters.setdefault(column_name, set())
+        if checked:
+            values.add(value)
+        else:
+            values.discard(value)
+            if not values:
+                del self.active_filters[column_name]
+        self.applyFilters()
+
+    def onFilterActionToggled(self, checked: bool):
+        """ one slot for all filter menu values, column and value are kept in action data """
+        column_name, value = self.sender().data()
+        self.toggleFilter(column_name, value, checked)
+
+    def clearFilters(self):
+        self.active_filters = {}
+        self.applyFilters()
+
+    def applyHiddenColumns(self):
+        self.page = 1
+        self.loadPage(hidden_columns=list(self.hidden_columns))
+        self.update_page_text()
+
+    def hideColumn(self, column_name: str):
+        self.hidden_columns.append(column_name)
+        self.applyHiddenColumns()
+
+    def showAllColumns(self):
+        self.hidden_columns = []
+        self.applyHiddenColumns()
+
+    def loadPage(self, query: str=None, filters: dict=None, hidden_columns: list=None, reset: bool=False):
         file_path = self.filePathEdit.text()
 
         if file_path:
-            if not hasattr(self, 'DATA'):
-                self.DATA = Data(path = file_path, 
-                                 virtual_table_name = settings.render_vars(settings.default_data_var_name),
-                                 batchsize = int(settings.result_pagination_rows_per_page))
-                
-            self.thread = QueryThread(
-                                        DATA  = self.DATA,
-                                        query = query, 
-                                        nth_batch = self.page, 
-                                        app = self)
-            
-            self.thread.resultReady.connect(self.handleResults)
-            self.thread.errorOccurred.connect(self.handleError)
-            self.thread.start()
-            self.thread.finished.connect(self.update_page_text)
+            self.loading.start()
+            if self.openData(file_path) is None:
+                return
+            self._seq += 1
+            self.queryWorker.latest_seq = self._seq
+            page_job = query is None and filters is None and hidden_columns is None and not reset
+            if not page_job:
+                self._pending_seq = self._seq
+            if query is not None or filters is not None or reset:
+                self._result_id += 1
+            # page still being fetched is not wanted anymore
+            self.queryWorker.interruptPage(self._seq)
+            # already seen page of the same result is shown without a query
+            if page_job and self._pending_seq is None:
+                cached = self.DATA.get_cached_batch(self.page)
+                if cached is not None:
+                    self.handleResults(self._seq, cached)
+                    return
+
+            self.queryRequested.emit(self._seq, self.DATA, self.page, query, filters, hidden_columns, reset)
         else:
             self.resultLabel.setText("Browse file first...")
 
-    def handleResults(self, df):
-        self.thread.quit()
-        self.thread.wait()
-        self.df = df
-        self.displayResults(df)
+    def handleResults(self, seq: int, table, str_columns: list = None, source: tuple = None, state: tuple = None):
+        self.jobDone(seq)
+        # result of a job the user already navigated away from
+        if seq != self._seq:
+            return
+        # cached pages come without state, it didn't change
+        if state is not None:
+            self.active_filters, self.hidden_columns = state
+        self.page_data = table
+        # cached pages come without source, they are of the same result
+        if source is not None:
+            self.page_source = source
+        self.displayResults(table, str_columns)
         self.loading.stop()
+        self.update_page_text()
+        if self.total_pages is None:
+            self.countPages()
 
-    def handleError(self, error):
-        self.thread.quit()
-        self.thread.wait()
-        self.resultLabel.setText(f"Error: {error}")
-        self.loading.stop()
+    def jobDone(self, seq: int):
+        """ worker runs jobs in order, so once it answers `seq` the pending query or filters are applied """
+        if self._pending_seq is not None and seq >= self._pending_seq:
+            self._pending_seq = None
 
+    def countPages(self, force: bool = False):
+        """ count pages of the displayed result on the thread pool, unless it is already being counted """
+        if self._counting == self._result_id and not force:
+            return
+        self._counting = self._result_id
+        self.runTask(partial(self.DATA.count_batches, *self.page_source),
+                     partial(self.handleTotal, self._result_id))
 
-    def displayResults(self, df):
-        # Set the table dimensions
-        self.resultTable.setColumnCount(len(df.columns))
-        self.resultTable.setRowCount(len(df.index))
+    def handleTotal(self, result_id: int, total_pages: int):
+        # query, filters or file changed while counting
+        if result_id != self._result_id:
+            return
+        self.total_pages = total_pages
+        self.update_page_text()
 
-        # Set the column headers
-        self.resultTable.setHorizontalHeaderLabels(df.columns)
+    def handleError(self, seq: int, error, state: tuple):
+        self.jobDone(seq)
+        if seq != self._seq:
+            return
+        self.active_filters, self.hidden_columns = state
+        self.resultLabel.setText(f"Error: {error}")
+        self.loading.stop()
 
-        # Fill the table with the DataFrame data
-        for i in range(len(df.index)):
-            for j in range(len(df.columns)):
-                self.resultTable.setItem(i, j, QTableWidgetItem(str(df.iat[i, j])))
+    def runTask(self, fn: Callable, callback: Callable):
+        """ run `fn` on the thread pool, `callback` gets its result on the GUI thread """
+        QThreadPool.globalInstance().start(Task(fn, callback, self.taskDone))
 
-        # Resize columns to fit content
-        self.resultTable.resizeColumnsToContents()
+    def onTaskDone(self, callback: Callable, result):
+        if isinstance(result, Exception):
+            self.resultLabel.setText(f"Error: {result}")
+            return
+        callback(result)
+
+    def closeEvent(self, event):
+        self.queryThread.quit()
+        self.queryThread.wait()
+        # tasks emit into this window, let them finish first
+        QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(event)
+
+
+    def displayResults(self, table, str_columns: list = None):
+        # repaint once after reset and sizing instead of on each step
+        self.resultTable.setUpdatesEnabled(False)
+        # without `str_columns` (cached pages) model stringifies only the columns that are actually painted
+        self.resultModel.setTable(table, str_columns)
+
+        # Resize columns to fit content of the first page
+        if self.page == 1:
+            self.fitColumnsToSample()
+        self.resultTable.setUpdatesEnabled(True)
+
+    def fitColumnsToSample(self, sample_rows: int = 20, padding: int = 16):
+        """ size columns by header and first `sample_rows` rows, `resizeColumnsToContents` measures every cell """
+        cell_metrics = self.resultTable.fontMetrics()
+        header_metrics = self.resultTable.horizontalHeader().fontMetrics()
+        n_rows = min(sample_rows, self.resultModel.rowCount())
+        for column in range(self.resultModel.columnCount()):
+            width = header_metrics.horizontalAdvance(self.resultModel.headerData(column, Qt.Horizontal))
+            for row in range(n_rows):
+                text = self.resultModel.data(self.resultModel.index(row, column))
+                width = max(width, cell_metrics.horizontalAdvance(text))
+            self.resultTable.setColumnWidth(column, width + padding)
 
 
     def update_page_text(self):
-        """ set next / prev button text """
+        """ set next / prev button text and disable them at the edges """
+        total_pages = self.total_pages if self.total_pages is not None else "???"
         self.prevButton.setText(f"[{self.page-1 if self.page > 1 else ''}] << ")
-        self.currentPageButton.setText(f"[{self.page}] / {self.total_pages} ")
+        self.currentPageButton.setText(f"[{self.page}] / {total_pages} ")
         self.nextButton.setText(f">> [{self.page+1}]")
+        self.prevButton.setEnabled(self.page > 1)
+        self.nextButton.setEnabled(self.total_pages is None or self.page < self.total_pages)
 
 
     def prevPage(self):
@@ -373,8 +666,7 @@ class ParquetSQLApp(QMainWindow):
 
     def nextPage(self):
         # if is the last page, do nothing
-        print(f"total batches: {self.DATA.total_batches}; Page: {self.page}")
-        if isinstance(self.DATA.total_batches, int) and self.page >= self.DATA.total_batches:
+        if self.total_pages is not None and self.page >= self.total_pages:
             return
         self.page += 1
         self.loadPage()
@@ -384,8 +676,7 @@ class ParquetSQLApp(QMainWindow):
         """ calculate how many pages data will have, if `force` is False then won't recalculate it """
         if hasattr(self, 'DATA'):   # for prevent attempt of calc in init state
             if force or self.total_pages is None:
-                self.total_pages = self.DATA.calc_n_batches()
-                self.update_page_text()
+                self.countPages(force=True)
                 
 
     def showContextMenu(self, pos):
@@ -396,7 +687,7 @@ class ParquetSQLApp(QMainWindow):
         row = self.resultTable.indexAt(pos).row()
 
         if column >= 0:
-            column_name = self.resultTable.horizontalHeaderItem(column).text()
+            column_name = self.resultModel.headerData(column, Qt.Horizontal)
 
             # Create Copy Submenu
             copy_menu = QMenu("Copy", self)
@@ -415,37 +706,97 @@ class ParquetSQLApp(QMainWindow):
 
             contextMenu.addMenu(copy_menu)
 
+            # Create Filter Submenu, nested values (lists, structs) can't be filtered on
+            if not pa.types.is_nested(self.page_data.schema.field(column).type):
+                filter_menu = QMenu("Filter", self)
+                loading_action = filter_menu.addAction("Loading values...")
+                loading_action.setEnabled(False)
+                # one extra value tells if the list was cut, high-cardinality columns are not fetched whole.
+                # values are read on the thread pool, the menu opens at once and is filled when they come
+                self.runTask(partial(self.DATA.get_uniques, column_name, FILTER_MENU_MAX_VALUES + 1),
+                             partial(self.showFilterValues, filter_menu, self.DATA, column_name))
+                contextMenu.addMenu(filter_menu)
+
+            # last column can't be hidden, page would have no columns
+            if self.page_data.num_columns > 1:
+                hide_column_action = QAction("Hide Column", self)
+                hide_column_action.triggered.connect(lambda: self.hideColumn(column_name))
+                contextMenu.addAction(hide_column_action)
+
+        if self.hidden_columns:
+            show_columns_action = QAction(f"Show All Columns ({len(self.hidden_columns)} hidden)", self)
+            show_columns_action.triggered.connect(self.showAllColumns)
+            contextMenu.addAction(show_columns_action)
+
+        if self.active_filters:
+            clear_filters_action = QAction("Clear Filters", self)
+            clear_filters_action.triggered.connect(self.clearFilters)
+            contextMenu.addAction(clear_filters_action)
+
         contextMenu.exec_(self.resultTable.mapToGlobal(pos))
 
+    def showFilterValues(self, filter_menu: QMenu, DATA: Data, column_name: str, unique_values: list):
+        """ fill the filter menu with first distinct values, add a search field if there are more of them """
+        if len(unique_values) > FILTER_MENU_MAX_VALUES:
+            # too many values to list, let duckdb narrow them down
+            search_edit = QLineEdit(filter_menu)
+            search_edit.setPlaceholderText("Search values, press Enter")
+            search_action = QWidgetAction(filter_menu)
+            search_action.setDefaultWidget(search_edit)
+            filter_menu.insertAction(filter_menu.actions()[0], search_action)
+            search_edit.returnPressed.connect(
+                lambda: self.runTask(partial(DATA.get_uniques, column_name, FILTER_MENU_MAX_VALUES + 1, search_edit.text()),
+                                     partial(self.fillFilterMenu, filter_menu, column_name)))
+        self.fillFilterMenu(filter_menu, column_name, unique_values)
+
+    def fillFilterMenu(self, filter_menu: QMenu, column_name: str, unique_values: list):
+        """ (re)place value actions of the filter menu, the search field stays """
+        for action in filter_menu.actions():
+            if not isinstance(action, QWidgetAction):
+                filter_menu.removeAction(action)
+
+        checked_values = self.active_filters.get(column_name, set())
+        actions = []
+        for value in unique_values[:FILTER_MENU_MAX_VALUES]:
+            value_action = QAction(str(value), filter_menu)
+            value_action.setCheckable(True)
+            value_action.setChecked(value in checked_values)
+            value_action.setData((column_name, value))
+            value_action.triggered.connect(self.onFilterActionToggled)
+            actions.append(value_action)
+        if len(unique_values) > FILTER_MENU_MAX_VALUES:
+            more_action = QAction("... more values", filter_menu)
+            more_action.setEnabled(False)
+            actions.append(more_action)
+        # one relayout for all values
+        filter_menu.addActions(actions)
+
     def copyColumnName(self, column_name):
         clipboard = QApplication.clipboard()
         clipboard.setText(column_name)
 
     def copyColumnValues(self, column):
-        values = self.df.iloc[:, column].tolist()
+        values = self.page_data.column(column).to_pylist()
         clipboard = QApplication.clipboard()
         clipboard.setText(str(values))
 
     def copyRowValues(self, row):
-        values = self.df.iloc[row, :].tolist()
+        values = [column[row].as_py() for column in self.page_data.columns]
         clipboard = QApplication.clipboard()
         clipboard.setText(str(values))
 
 
     def exportResults(self):
         options = QFileDialog.Options()
-        filePath, _ = QFileDialog.getSaveFileName(self, "Export Results", "", "CSV Files (*.csv);;Parquet Files (*.parquet);;All Files (*)", options=options)
+        filePath, _ = QFileDialog.getSaveFileName(self, "Export Results", "", "CSV Files (*.csv);;Parquet Files (*.parquet);;Excel Files (*.xlsx);;All Files (*)", options=options)
         if filePath:
-            if filePath.endswith('.csv'):
-                self.DATA.reader.duckdf_query.to_csv(filePath)
-            # elif filePath.endswith('.xlsx'):  
-            # # todo: add support for xlsx(https://duckdb.org/docs/guides/file_formats/excel_export.html)
-            #     self.DATA.reader.duckdf_query.to(filePath, index=False)
-
-            elif filePath.endswith('.parquet'):
-                self.DATA.reader.duckdf_query.to_parquet(filePath)
+            # csv and parquet are written by duckdb itself over the whole filtered result
+            if filePath.endswith(('.csv', '.parquet', '.xlsx')):
+                self.resultLabel.setText(f"Exporting to {filePath}...")
+                self.runTask(partial(self.DATA.reader.export, filePath, *self.page_source),
+                             lambda _: self.resultLabel.setText(f"Exported to {filePath}"))
             else:
-                QMessageBox.warning(self, "Invalid File Type", "Please select a valid file type (CSV or XLSX).")
+                QMessageBox.warning(self, "Invalid File Type", "Please select a valid file type (CSV, Parquet or XLSX).")
 
 
     def toggleTableInfo(self):
@@ -453,17 +804,32 @@ class ParquetSQLApp(QMainWindow):
             if not hasattr(self, 'DATA'):
                 return
             
-            table_info = render_df_info(self.DATA.reader.duckdf_query)
+            reader = self.DATA.reader
+            columns, types = reader.duckdf_result.columns, reader.duckdf_result.types
             dialog = QDialog(self, Qt.WindowTitleHint | Qt.WindowCloseButtonHint)
             dialog.setWindowTitle("Table Info")
 
             text_browser = QTextBrowser(dialog)
-            text_browser.setMarkdown(table_info)
             text_browser.setReadOnly(True)
             text_browser.setOpenExternalLinks(True)
+            # row count and statistics come from the thread pool, table is rendered again with each of them
+            info = {'n_rows': "???", 'stats': None}
+            def render(**computed):
+                info.update(computed)
+                text_browser.setMarkdown(render_df_info(columns, types, info['n_rows'], info['stats']))
+            render()
+            # row count is cached by the reader, usually already counted for the page total
+            self.runTask(partial(reader.count_rows, *self.page_source), lambda n_rows: render(n_rows=n_rows))
+
+            # statistics scan every numeric column, so they are computed only on demand
+            stats_button = QPushButton("Compute Statistics", dialog)
+            stats_button.clicked.connect(lambda: (stats_button.setEnabled(False),
+                                                  self.runTask(partial(reader.column_stats, *self.page_source),
+                                                               lambda stats: render(stats=stats))))
 
             layout = QVBoxLayout()
             layout.addWidget(text_browser)
+            layout.addWidget(stats_button)
             dialog.setLayout(layout)
 
             dialog.setWindowFlags(Qt.Dialog | Qt.FramelessWindowHint)
@@ -485,7 +851,9 @@ class ParquetSQLApp(QMainWindow):
             # these settings won't be editable
             read_only_fields = ["recents_file", 'settings_file', 'default_settings_file', "static_dir", 'usr_recents_file',
                                 'usr_settings_file', 'user_app_settings_dir', ]
-            
+            # empty is a valid value of these settings, other emptied fields keep their previous value
+            optional_fields = ['duckdb_memory_limit']
+
             help_text = "Did you know:\nYou can use field names inside string as `$(field_name)` for render it."
             def __init__(self, settings: Settings, 
                          default_settings_file: Path):
@@ -510,6 +878,14 @@ class ParquetSQLApp(QMainWindow):
                         if not (10 <= int(line_edit.text()) <= 1000):
                             QMessageBox.critical(self, "Error", "The result pagination rows per page must be between 10 and 1000.")
                             return False
+                    if field == 'duckdb_memory_limit' and line_edit.text():
+                        # duckdb parses the limit itself, a trial connection accepts exactly what it accepts
+                        try:
+                            duckdb.connect(':memory:', config={'memory_limit': line_edit.text()}).close()
+                        except duckdb.Error:
+                            QMessageBox.critical(self, "Error", "The duckdb memory limit must be a size like '4GB' or '512MB', "
+                                                                "or empty for the duckdb default.")
+                            return False
 
                 return True
 
@@ -553,7 +929,7 @@ class ParquetSQLApp(QMainWindow):
                     QMessageBox.critical(self, "Error", "Please fix the errors before saving.")
                     return
                 for field, line_edit in self.fields.items():
-                    if line_edit.text():
+                    if line_edit.text() or field in self.optional_fields:
                         if field == 'sql_keywords':
                             # replace stringed list into list[str]
                             kws = line_edit.text()
@@ -4,6 +4,9 @@ from typing import Union
 from schemas import settings, BadQueryException
 
 
+WHITESPACE = re.compile(r'\s+')
+LIMIT_VALUE = re.compile(r'limit\s+([0-9]+)')
+
 
 class Revisor:
     def __init__(self, query: str):
@@ -15,13 +18,13 @@ class Revisor:
 
     def clear_q(self, query: str) -> str:
         """ clear the query from extra whitespaces """
-        result = re.sub(r'\s+', ' ', query)
+        result = WHITESPACE.sub(' ', query)
         return result.strip().lower()
     
     def _rule_limit_range(self) -> str:
         """ limit value must be between 0 and settings.max_rows """
         if 'limit' in self.query:
-            limit = re.findall(r'limit\s+([0-9]+)', self.query)
+            limit = LIMIT_VALUE.findall(self.query)
             if not limit:
                 return BadQueryException(name="No LIMIT", 
                                         message='The query must contain a limit.')
@@ -27,6 +27,7 @@ class Settings(BaseModel):
         result_pagination_rows_per_page: str
         save_file_history: str
         max_rows: str - max rows for limit in sql query
+        duckdb_memory_limit: str - duckdb memory limit like '4GB', empty for duckdb default (80% of RAM)
     """
     # data
     default_data_var_name: str
@@ -39,6 +40,7 @@ class Settings(BaseModel):
     result_pagination_rows_per_page: str
     save_file_history: str
     max_rows: str
+    duckdb_memory_limit: str = ""
     # colors
     colour_browseButton: str
     colour_sqlEdit: str
@@ -99,10 +101,8 @@ class Settings(BaseModel):
     def get_user_settings(cls):
         user_app_settings_dir: Path = Path.home() / ".ParVu"
         settings = (user_app_settings_dir / "settings" / "settings.json")
-        with settings.open('r') as f:
-            settings_data = f.read()
-
-            return cls.model_validate_json(settings_data)
+        # pydantic-core parses the raw bytes itself, no str decode or json module in between
+        return cls.model_validate_json(settings.read_bytes())
 
 
     @classmethod
@@ -128,14 +128,15 @@ class Settings(BaseModel):
 
     def save_settings(self):
         # Save current settings to JSON file
-        settings_json = self.model_dump_json()
-        # settings_file = self.usr_settings_file.as_posix()
-        with open(self.usr_settings_file, "w") as f:
-            f.writelines(settings_json.splitlines())
+        self.usr_settings_file.write_text(self.model_dump_json())
 
 settings = Settings.load_settings()
 
 
+# how many recently opened files are remembered
+MAX_RECENTS = 20
+
+
 class Recents(BaseModel):
     """ Recent opened files history """
     recents: list[str]
@@ -143,23 +144,19 @@ class Recents(BaseModel):
     @classmethod
     def load_recents(cls):
         # Load recents from JSON file
-        with open(settings.usr_recents_file, "r") as f:
-            recents_data = f.read()
-
-        model = cls.model_validate_json(recents_data)
-        return model
+        return cls.model_validate_json(settings.usr_recents_file.read_bytes())
     
     def add_recent(self, path):
-        # add browsed file to recents
-        self.recents.insert(0, path)
-        self.recents = list(set(self.recents))
-        self.save_recents()
+        # add browsed file to recents: most recent first, no duplicates, bounded
+        recents = list(dict.fromkeys([path, *self.recents]))[:MAX_RECENTS]
+        # reopening the latest file changes nothing, skip the write
+        if recents != self.recents:
+            self.recents = recents
+            self.save_recents()
 
     def save_recents(self):
         # Save current recents to JSON file
-        recents_json = self.model_dump_json()
-        with open(settings.usr_recents_file, "w") as f:
-            f.writelines(recents_json.splitlines())
+        settings.usr_recents_file.write_text(self.model_dump_json())
 
 recents = Recents.load_recents()
 
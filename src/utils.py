@@ -1,14 +1,17 @@
 """ module contains general purpose tools """
 from pathlib import Path
-from itertools import islice, tee
-from typing import Generator, Tuple
+from typing import TYPE_CHECKING
 
-import pandas as pd
 from loguru import logger
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def read_table(file_path: Path, **kwargs) -> pd.DataFrame:
+
+def read_table(file_path: Path, **kwargs) -> "pd.DataFrame":
     """ read table from passed file. Supported formats: parquet, csv, json, excel """
+    import pandas as pd
+
     readers = {
         '.parquet': pd.read_parquet,
         '.csv': pd.read_csv,
@@ -26,16 +29,11 @@ def read_table(file_path: Path, **kwargs) -> pd.DataFrame:
 
 
 
-def nth_from_generator(generator: Generator, n: int):
-    """ Get directly nth item from generator """
-    logger.debug(f"Getting {n}th item from generator of len {len(generator)} and type: {type(generator)}")
-    return next(islice(generator, n, n+1), None)
+def quote_ident(name: str) -> str:
+    """ quote identifier for sql, embedded double quotes are escaped """
+    return '"' + name.replace('"', '""') + '"'
 
 
-def copy_count_gen_items(generator) -> Tuple[Generator, int]:
-    """ returns a copy of the generator and items count in it """
-    logger.debug(f"Copy-count generator of len {len(generator)} and type: {type(generator)}")
-    gen_copy, gen_count = tee(generator)
-    count = sum(1 for _ in gen_count)
-    logger.debug(f"Count: {count}")
-    return gen_copy, count
\ No newline at end of file
+def quote_literal(value: str) -> str:
+    """ quote string literal for sql, for places where values can't be bound, embedded single quotes are escaped """
+    return "'" + value.replace("'", "''") + "'"